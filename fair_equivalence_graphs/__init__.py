@@ -1,3 +1,9 @@
 # flake8: noqa
 
-from .core import get_equivalence_ratio, get_perturbations, run_fair
+from .core import (
+    get_equivalence_ratio,
+    get_equivalence_ratios_batch,
+    get_perturbations,
+    run_fair,
+    run_fair_batch,
+)
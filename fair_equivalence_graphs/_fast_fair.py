@@ -0,0 +1,124 @@
+import math
+
+import numpy as np
+from fair.constants.general import ppm_gtc
+from fair.defaults import carbon, thermal
+from fair.gas_cycle.fair1 import _iirf_interp
+from fair.temperature.millar import calculate_q
+from scipy.optimize import root
+
+# FaIR's defaults, as used by fair.forward.fair_scm in CO2-only mode
+C_PI = 278.0
+A = [float(x) for x in carbon.a]
+TAU = [float(x) for x in carbon.tau]
+D = [float(x) for x in thermal.d]
+Q = [
+    float(x)
+    for x in calculate_q(thermal.tcrecs, thermal.d, thermal.f2x, thermal.tcr_dbl, 1)[0]
+]
+F2X = thermal.f2x
+
+
+def _time_scale_sf(iirf: float, alpha: float) -> float:
+    """Solve Eq. (7) of Millar et al. (2017) for alpha, the CO2 decay time constant scaling
+    factor, with Newton's method starting from the previous year's value
+
+    A large storage can drive {iirf} so low that alpha is close to zero, where the slope of
+    Eq. (7) cancels out and Newton's method steps to alpha <= 0 or overflows. If it doesn't
+    converge, the year is solved with FaIR's own `scipy.optimize.root` call instead, so the
+    result still matches fair_scm.
+    """
+    guess = alpha
+    try:
+        for _ in range(50):
+            total = 0.0
+            slope = 0.0
+            for a, tau in zip(A, TAU):
+                decay = math.exp(-carbon.iirf_h / (tau * alpha))
+                total += a * tau * (1.0 - decay)
+                slope += a * decay
+            residual = alpha * total - iirf
+            step = residual / (total - carbon.iirf_h / alpha * slope)
+            alpha -= step
+            if not alpha > 0:
+                break
+            if abs(step) <= 1.49012e-8 * alpha:
+                return alpha
+    except (OverflowError, ZeroDivisionError):
+        pass
+    return float(
+        root(_iirf_interp, guess, args=(carbon.a, carbon.tau, carbon.iirf_h, iirf))[
+            "x"
+        ][0]
+    )
+
+
+def fast_fair_scm(
+    emissions: np.ndarray, other_rf: np.ndarray
+) -> (np.ndarray, np.ndarray, np.ndarray):
+    """Emissions-driven, CO2-only FaIR 1.x with the FaIR v1.0 carbon cycle
+
+    Equivalent to `fair.forward.fair_scm(emissions=emissions, other_rf=other_rf,
+    useMultigas=False, gir_carbon_cycle=False)` with every other argument at its default:
+    a 4-box carbon cycle with state-dependent decay times, logarithmic CO2 forcing and a
+    2-box temperature response. FaIR's general-purpose loop spends most of its time in a
+    `scipy.optimize.root` call per year, this solves for the same scaling factor with a
+    scalar Newton iteration instead.
+
+    Parameters
+    ----------
+    emissions : np.ndarray
+        1D array of CO2 emissions (GtC/yr)
+    other_rf : np.ndarray
+        1D array of non-CO2 radiative forcing (W m-2)
+
+    Returns
+    -------
+    C : np.ndarray
+        CO2 concentrations (ppm)
+    F : np.ndarray
+        Total radiative forcing (W m-2)
+    T : np.ndarray
+        Temperature change (K) compared to preindustrial
+    """
+    # plain Python floats are much faster than NumPy scalars in this serial loop
+    emissions = np.asarray(emissions, dtype=float).tolist()
+    other_rf = np.asarray(other_rf, dtype=float).tolist()
+    nt = len(emissions)
+    C = [0.0] * nt
+    F = [0.0] * nt
+    T = [0.0] * nt
+
+    thermal_decay = [math.exp(-1.0 / d) for d in D]
+    forcing_scale = F2X / math.log(2)
+
+    e0 = emissions[0]
+    boxes = [a * e0 / ppm_gtc for a in A]
+    c0 = sum(boxes) + C_PI
+    f0 = forcing_scale * math.log(c0 / C_PI) + other_rf[0]
+    temps = [q / d * f0 for q, d in zip(Q, D)]
+    C[0], F[0], T[0] = c0, f0, sum(temps)
+
+    c_acc = 0.0
+    alpha = 0.16
+    for t in range(1, nt):
+        e1 = emissions[t]
+        iirf = min(
+            carbon.r0 + carbon.rc * c_acc + carbon.rt * T[t - 1], carbon.iirf_max
+        )
+        alpha = _time_scale_sf(iirf, alpha)
+        boxes = [
+            box * math.exp(-1.0 / (tau * alpha)) + a * e1 / ppm_gtc
+            for box, a, tau in zip(boxes, A, TAU)
+        ]
+        c1 = sum(boxes) + C_PI
+        c_acc = c_acc + 0.5 * (e1 + e0) - (c1 - c0) * ppm_gtc
+        f1 = forcing_scale * math.log(c1 / C_PI) + other_rf[t]
+        temps = [
+            temp * decay + q * (1.0 - decay) * f1
+            for temp, decay, q in zip(temps, thermal_decay, Q)
+        ]
+        C[t], F[t], T[t] = c1, f1, sum(temps)
+        e0, c0 = e1, c1
+
+    return np.array(C), np.array(F), np.array(T)
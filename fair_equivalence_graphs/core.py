@@ -1,10 +1,42 @@
-import copy
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Optional
 
-import fair
 import numpy as np
+from fair.defaults import carbon
 from scipy import optimize
 
+from ._fast_fair import fast_fair_scm
+
+SCENARIOS = ("default", "permanent", "temporary", "offset", "justified")
+
+# relative tolerance of every equivalence ratio search. Ratios are reported to 2-3
+# significant figures, so anything tighter only costs FaIR runs
+_RTOL = 1e-5
+
+
+def _year_index(scenario: np.ndarray, temp_yr: int) -> int:
+    """Index of {temp_yr} in the scenario emissions. SSP years are consecutive, so this is
+    an offset from the first year rather than a search"""
+    years = scenario.Emissions.year
+    assert years[1] - years[0] == 1
+    yr_idx = int(temp_yr - years[0])
+    if not 0 <= yr_idx < len(years):
+        raise ValueError(f"{temp_yr} is not in the scenario years")
+    return yr_idx
+
+
+def _sparse_perturbations(
+    yr_idx: int, temp_length: int, temp_magnitude: float, equivalence_ratio: float
+) -> ((int, float), (int, float), (int, float)):
+    """`(index, value)` pairs for the storage, re-emission and justified perturbations,
+    which are each a single nonzero year"""
+    return (
+        (yr_idx, -1 * temp_magnitude),
+        (yr_idx + temp_length, temp_magnitude),
+        (yr_idx, temp_magnitude * (1 / equivalence_ratio)),
+    )
+
 
 def get_perturbations(
     scenario: np.ndarray,
@@ -42,24 +74,55 @@ def get_perturbations(
         according to the provided {equivalence_ratio}
     """
 
-    yr_idx = np.where(scenario.Emissions.year == temp_yr)[0][0]
+    yr_idx = _year_index(scenario, temp_yr)
 
     storage = np.zeros_like(scenario.Emissions.co2)
     reemission = np.zeros_like(scenario.Emissions.co2)
     justified = np.zeros_like(scenario.Emissions.co2)
 
-    storage[yr_idx] += -1 * temp_magnitude
-    reemission[yr_idx + temp_length] += temp_magnitude
-    justified[yr_idx] += temp_magnitude * (1 / equivalence_ratio)
+    perturbations = _sparse_perturbations(
+        yr_idx, temp_length, temp_magnitude, equivalence_ratio
+    )
+    for array, (idx, value) in zip((storage, reemission, justified), perturbations):
+        array[idx] += value
 
     return storage, reemission, justified
 
 
+def _default_emissions(scenario: np.ndarray, n_years: int = None) -> np.ndarray:
+    """Total CO2 emissions of the unperturbed scenario, as a new array"""
+    return (
+        scenario.Emissions.co2_land[:n_years] + scenario.Emissions.co2_fossil[:n_years]
+    )
+
+
+def _build_scenarios(
+    default_emissions: np.ndarray,
+    storage: np.ndarray,
+    reemission: np.ndarray,
+    justified: np.ndarray,
+) -> dict:
+    """Build the experimental emission scenarios as rows of a single preallocated array,
+    reusing partial sums and adding in place"""
+    emissions = np.empty((len(SCENARIOS), len(default_emissions)))
+    default, permanent, temporary, offset, justified_scenario = emissions
+
+    default[:] = default_emissions
+    np.add(default, storage, out=permanent)
+    np.add(permanent, reemission, out=temporary)
+    np.add(temporary, justified, out=offset)
+    np.add(default, justified, out=justified_scenario)
+
+    return dict(zip(SCENARIOS, emissions))
+
+
 def run_fair(
     scenario: np.ndarray,
     storage: np.ndarray,
     reemission: np.ndarray,
     justified: np.ndarray,
+    scenarios: Iterable[str] = SCENARIOS,
+    n_years: int = None,
 ) -> (dict, dict):
     """Run the FaIR model
 
@@ -73,6 +136,12 @@ def run_fair(
         1D array representing the magnitude and timing of carbon re-emission
     justified : np.ndarray
         1D array representing emissions justified by temporary carbon storage
+    scenarios : Iterable[str]
+        Names of the experimental scenarios to run through FaIR (defaults to all five).
+        Emission scenarios are always built, but only these keys appear in `fair_results`
+    n_years : int, optional
+        Number of years to integrate from the start of the scenario. FaIR is causal, so
+        results for these years are unchanged by dropping later ones. Defaults to all years.
 
     Returns
     -------
@@ -101,26 +170,15 @@ def run_fair(
     """
 
     fair_results = defaultdict(dict)
-    default_emissions = scenario.Emissions.co2_land + scenario.Emissions.co2_fossil
-
-    experimental_scenarios = {
-        "default": default_emissions,
-        "permanent": copy.copy(default_emissions) + storage,
-        "temporary": copy.copy(default_emissions) + storage + reemission,
-        "offset": copy.copy(default_emissions) + storage + reemission + justified,
-        "justified": copy.copy(default_emissions) + justified,
-    }
-
-    for name, emissions in experimental_scenarios.items():
-        C, F, T = fair.forward.fair_scm(
-            emissions=emissions,
-            other_rf=np.zeros_like(emissions),
-            # ghg_forcing='Meinshausen',
-            # rc=0.01,
-            # rt=2,
-            useMultigas=False,
-            gir_carbon_cycle=False,
-        )
+    default_emissions = _default_emissions(scenario, n_years)
+
+    experimental_scenarios = _build_scenarios(
+        default_emissions, storage[:n_years], reemission[:n_years], justified[:n_years]
+    )
+
+    other_rf = np.zeros_like(default_emissions)
+    for name in scenarios:
+        C, F, T = fast_fair_scm(experimental_scenarios[name], other_rf)
 
         fair_results[name]["atm_c"] = C
         fair_results[name]["rf"] = F
@@ -129,6 +187,104 @@ def run_fair(
     return experimental_scenarios, fair_results
 
 
+# SSPs shipped to each worker process once, keyed by id in the parent process
+_worker_ssps = {}
+
+
+def _init_worker(ssps: dict) -> None:
+    _worker_ssps.update(ssps)
+
+
+def _run_fair_in_worker(
+    ssp_key: int,
+    storage: np.ndarray,
+    reemission: np.ndarray,
+    justified: np.ndarray,
+) -> (dict, dict):
+    return run_fair(_worker_ssps[ssp_key], storage, reemission, justified)
+
+
+def run_fair_batch(
+    ssps: list,
+    storages: list,
+    reemissions: list,
+    justifieds: list,
+    max_workers: int = None,
+) -> list:
+    """Run the FaIR model for many independent inputs in parallel processes
+
+    Parameters
+    ----------
+    ssps : list
+        FaIR provided SSP emissions scenarios (e.g. `fair.SSPs.ssp245`), one per run
+    storages : list
+        1D storage arrays, one per run, see `run_fair`
+    reemissions : list
+        1D re-emission arrays, one per run, see `run_fair`
+    justifieds : list
+        1D justified emission arrays, one per run, see `run_fair`
+    max_workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+
+    Returns
+    -------
+    results : list
+        `(emissions_scenarios, fair_results)` tuples as returned by `run_fair`, in the
+        order of the inputs
+    """
+    lengths = {len(ssps), len(storages), len(reemissions), len(justifieds)}
+    if len(lengths) > 1:
+        raise ValueError(
+            "ssps, storages, reemissions and justifieds must have the same length"
+        )
+
+    # send each distinct SSP once per worker rather than pickling it with every run
+    keys = [id(ssp) for ssp in ssps]
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(dict(zip(keys, ssps)),),
+    ) as executor:
+        return list(
+            executor.map(_run_fair_in_worker, keys, storages, reemissions, justifieds)
+        )
+
+
+def _default_rf(scenario: np.ndarray) -> np.ndarray:
+    """Radiative forcing of the unperturbed scenario, which does not depend on any of the
+    temporary storage parameters"""
+    zeros = np.zeros_like(scenario.Emissions.co2)
+    _, fair_results = run_fair(scenario, zeros, zeros, zeros, scenarios=("default",))
+    return fair_results["default"]["rf"]
+
+
+def _offset_rf_sum(
+    equivalence_ratio: float,
+    scenario: np.ndarray,
+    temp_yr: int,
+    temp_length: int,
+    temp_magnitude: float,
+    time_horizon: int,
+) -> float:
+    """Cumulative radiative forcing of the offset scenario over {time_horizon} years
+    starting at {temp_yr}"""
+    # nothing after the end of the time horizon is compared, so don't integrate it
+    yr_idx = _year_index(scenario, temp_yr)
+    n_years = yr_idx + time_horizon
+
+    # apply the perturbations directly rather than adding full-length arrays, in the
+    # same order as `run_fair` so the offset emissions are identical
+    offset = _default_emissions(scenario, n_years)
+    for idx, value in _sparse_perturbations(
+        yr_idx, temp_length, temp_magnitude, equivalence_ratio
+    ):
+        if idx < n_years:
+            offset[idx] += value
+
+    _, rf, _ = fast_fair_scm(offset, np.zeros_like(offset))
+    return rf[yr_idx:n_years].sum()
+
+
 def compare_rf(
     equivalence_ratio: float,
     scenario: np.ndarray,
@@ -136,6 +292,7 @@ def compare_rf(
     temp_length: int,
     temp_magnitude: float,
     time_horizon: int,
+    default_rf: np.ndarray = None,
 ) -> float:
     """Helper function for finding an equivalence ratio that compares radiative forcing outcomes
     between a default scenario and an offset scenario.
@@ -152,32 +309,98 @@ def compare_rf(
         Magnitude of temporary storage in GtC. The conversion factor from C to CO2 is 3.67.
         For orientation, annual CO2 emissions are ~36 GtCO2, so a little under 10 GtC.
     time_horizon : time horizon over which cumulative radiative forcing is compared
+    default_rf : np.ndarray, optional
+        Radiative forcing of the default scenario. The default scenario does not depend on
+        {equivalence_ratio}, so callers searching over it can run FaIR for it once and pass
+        the result here. If not provided, it is computed.
 
     Returns
     -------
     diff : float
         Returns the difference in cumulative radiative forcing (default scenario - offset scenario)
     """
-    storage, reemission, justified = get_perturbations(
-        scenario, temp_yr, temp_length, temp_magnitude, equivalence_ratio
-    )
-    _, fair_results = run_fair(scenario, storage, reemission, justified)
+    if default_rf is None:
+        default_rf = _default_rf(scenario)
 
-    yr_idx = np.where(scenario.Emissions.year == temp_yr)[0][0]
-    rf_d = sum(fair_results["default"]["rf"][yr_idx : yr_idx + time_horizon])
-    rf_o = sum(fair_results["offset"]["rf"][yr_idx : yr_idx + time_horizon])
+    yr_idx = _year_index(scenario, temp_yr)
+    rf_d = default_rf[yr_idx : yr_idx + time_horizon].sum()
+    rf_o = _offset_rf_sum(
+        equivalence_ratio, scenario, temp_yr, temp_length, temp_magnitude, time_horizon
+    )
     diff = rf_d - rf_o
     return diff
 
 
+def _agwp_co2(t: float) -> float:
+    """Time-integrated CO2 impulse response over {t} years, using FaIR's default carbon
+    cycle coefficients (Joos et al. 2013)"""
+    t = max(t, 0)
+    return np.sum(carbon.a * carbon.tau * (1 - np.exp(-t / carbon.tau)))
+
+
+def _estimate(temp_length: int, time_horizon: int) -> float:
+    """Linear impulse-response estimate of the equivalence ratio
+
+    For a linear carbon cycle the ratio is AGWP(H) / (AGWP(H) - AGWP(H - L)). FaIR's
+    state-dependent sinks put the root below that, by up to ~50% in the SSPs.
+    """
+    agwp = _agwp_co2(time_horizon)
+    return agwp / (agwp - _agwp_co2(time_horizon - temp_length))
+
+
+def _bracket(estimate: float) -> (float, float):
+    """Bracket for the equivalence ratio search around its impulse-response estimate"""
+    return max(1, estimate / 3), min(1000, 1.1 * estimate)
+
+
+def _secant_root(
+    objective: Callable[[float], float], estimate: float, lower: float
+) -> Optional[float]:
+    """Secant search for the root of {objective} in 1 / equivalence_ratio, starting from
+    {estimate} and {lower}
+
+    The justified emissions scale with 1 / equivalence_ratio and the offset forcing responds
+    almost linearly to such small perturbations, so the objective is nearly linear in that
+    variable and the secant method converges in two or three FaIR runs. Returns None if it
+    doesn't converge to a ratio in [1, 1000], or if the objective is already positive at
+    {lower} below that ratio. A large early storage can make FaIR's carbon cycle jump between
+    regimes, so the objective may cross zero more than once, and the lowest crossing is the
+    equivalence ratio.
+    """
+    values = {}
+
+    def inverse_objective(inverse: float) -> float:
+        values[inverse] = objective(1 / inverse)
+        return values[inverse]
+
+    result = optimize.root_scalar(
+        inverse_objective,
+        x0=1 / estimate,
+        x1=1 / lower,
+        method="secant",
+        rtol=_RTOL,
+        maxiter=10,
+    )
+    if not result.converged:
+        return None
+    equivalence_ratio = 1 / result.root
+    if 1 <= equivalence_ratio <= 1000 and (
+        equivalence_ratio <= lower or values[1 / lower] < 0
+    ):
+        return float(equivalence_ratio)
+    return None
+
+
 def get_equivalence_ratio(
     scenario: np.ndarray,
     temp_yr: int,
     temp_length: int,
     temp_magnitude: float,
     time_horizon: int,
+    default_rf: np.ndarray = None,
 ) -> float:
-    """Use binary search to find an equivalence ratio on radiative forcing outcomes modeled by FaIR
+    """Use the secant method, falling back to Brent's method, to find an equivalence ratio on
+    radiative forcing outcomes modeled by FaIR
 
     Parameters
     ----------
@@ -191,15 +414,101 @@ def get_equivalence_ratio(
         Magnitude of temporary storage in GtC. The conversion factor from C to CO2 is 3.67.
         For orientation, annual CO2 emissions are ~36 GtCO2, so a little under 10 GtC.
     time_horizon : time horizon over which cumulative radiative forcing is compared
+    default_rf : np.ndarray, optional
+        Radiative forcing of the default scenario, see `compare_rf`. If not provided, it is
+        computed once before the search.
 
     Returns
     -------
     Return float is the equivalence factor representing how much of the temporary storage
     described in the input parameters would be needed to justify an addition tCO2 emissions
     """
-    return optimize.bisect(
-        compare_rf,
-        1,
-        1000,
-        args=(scenario, temp_yr, temp_length, temp_magnitude, time_horizon),
+    # the default scenario is independent of the equivalence ratio, so only run it once
+    if default_rf is None:
+        default_rf = _default_rf(scenario)
+
+    yr_idx = _year_index(scenario, temp_yr)
+    rf_d = default_rf[yr_idx : yr_idx + time_horizon].sum()
+
+    def objective(equivalence_ratio: float) -> float:
+        return rf_d - _offset_rf_sum(
+            equivalence_ratio,
+            scenario,
+            temp_yr,
+            temp_length,
+            temp_magnitude,
+            time_horizon,
+        )
+
+    estimate = _estimate(temp_length, time_horizon)
+    lower, upper = _bracket(estimate)
+    # seeding at the bottom of the bracket also checks that no crossing lies below it
+    equivalence_ratio = _secant_root(objective, estimate, min(lower, 0.75 * estimate))
+    if equivalence_ratio is not None:
+        return equivalence_ratio
+
+    # fall back to a bracketed search, which always converges. If the objective is already
+    # positive at the bottom of the bracket, the lowest crossing is below it
+    if objective(lower) >= 0:
+        lower, upper = 1, lower
+    try:
+        return optimize.brenth(objective, lower, upper, xtol=_RTOL, rtol=_RTOL)
+    except ValueError:
+        # the estimate missed the root, fall back to the full range. The root scales roughly
+        # multiplicatively with time_horizon / temp_length, so search it in log space, where
+        # an absolute step is a relative step in the ratio
+        log_root = optimize.brenth(
+            lambda u: objective(np.exp(u)), 0, np.log(1000), xtol=_RTOL
+        )
+        return float(np.exp(log_root))
+
+
+def get_equivalence_ratios_batch(
+    scenario: np.ndarray,
+    temp_yrs: np.ndarray,
+    temp_lengths: np.ndarray,
+    temp_magnitudes: np.ndarray,
+    time_horizon: int,
+) -> np.ndarray:
+    """Find equivalence ratios for many temporary storage parameters in one scenario.
+    `temp_yrs`, `temp_lengths` and `temp_magnitudes` are broadcast against each other.
+
+    Parameters
+    ----------
+    scenario : np.ndarray
+        FaIR provided SSP emissions scenario that perturbations will be applied to
+    temp_yrs : np.ndarray
+        Years at which temporary carbon storage begins
+    temp_lengths : np.ndarray
+        Durations of temporary carbon storage
+    temp_magnitudes : np.ndarray
+        Magnitudes of temporary storage in GtC
+    time_horizon : time horizon over which cumulative radiative forcing is compared
+
+    Returns
+    -------
+    ratios : np.ndarray
+        Equivalence ratios with the broadcast shape of the inputs
+    """
+    temp_yrs, temp_lengths, temp_magnitudes = np.broadcast_arrays(
+        temp_yrs, temp_lengths, temp_magnitudes
     )
+    # the default scenario is shared by every element of the batch
+    default_rf = _default_rf(scenario)
+
+    # broadcasting often repeats parameter combinations, so search each one only once.
+    # The cache lives for this call only, so changes to the scenario are always seen
+    found = {}
+    ratios = np.empty(temp_yrs.shape)
+    for idx in np.ndindex(ratios.shape):
+        params = (
+            int(temp_yrs[idx]),
+            int(temp_lengths[idx]),
+            float(temp_magnitudes[idx]),
+        )
+        if params not in found:
+            found[params] = get_equivalence_ratio(
+                scenario, *params, time_horizon, default_rf=default_rf
+            )
+        ratios[idx] = found[params]
+    return ratios
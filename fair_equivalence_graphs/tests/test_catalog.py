@@ -1,10 +1,21 @@
+import copy
 import math
 
+import fair
 import numpy as np
 import pytest
 from fair.SSPs import ssp119, ssp245, ssp370  # noqa
+from scipy import optimize
 
-from fair_equivalence_graphs import get_equivalence_ratio, get_perturbations, run_fair
+from fair_equivalence_graphs import (
+    core,
+    get_equivalence_ratio,
+    get_equivalence_ratios_batch,
+    get_perturbations,
+    run_fair,
+    run_fair_batch,
+)
+from fair_equivalence_graphs._fast_fair import fast_fair_scm
 
 
 @pytest.mark.parametrize("scenario", [ssp119, ssp245, ssp370])
@@ -35,9 +46,15 @@ def test_perturbations_values(storage_magnitude, equivalence_ratio) -> None:
     storage, reemission, justified = get_perturbations(
         scenario, year, length, storage_magnitude, equivalence_ratio
     )
-    assert sum(storage) == (storage_magnitude * -1)
-    assert sum(reemission) == storage_magnitude
-    assert sum(justified) == storage_magnitude / equivalence_ratio
+    assert storage.sum() == (storage_magnitude * -1)
+    assert reemission.sum() == storage_magnitude
+    assert justified.sum() == storage_magnitude / equivalence_ratio
+
+
+@pytest.mark.parametrize("year", [1700, 2600])
+def test_get_perturbations_year_out_of_range(year) -> None:
+    with pytest.raises(ValueError):
+        get_perturbations(ssp245, year, 10, 1, 2)
 
 
 def test_run_fair() -> None:
@@ -68,10 +85,10 @@ def test_run_fair_rf_values(scenario, storage_magnitude) -> None:
     experimental_scenarios, fair_results = run_fair(
         scenario, storage, reemission, justified
     )
-    assert sum(fair_results["justified"]["rf"] - fair_results["default"]["rf"]) > 0
-    assert sum(fair_results["default"]["rf"] - fair_results["permanent"]["rf"]) > 0
-    assert sum(fair_results["default"]["rf"] - fair_results["temporary"]["rf"]) > 0
-    assert sum(fair_results["temporary"]["rf"] - fair_results["permanent"]["rf"]) > 0
+    assert (fair_results["justified"]["rf"] - fair_results["default"]["rf"]).sum() > 0
+    assert (fair_results["default"]["rf"] - fair_results["permanent"]["rf"]).sum() > 0
+    assert (fair_results["default"]["rf"] - fair_results["temporary"]["rf"]).sum() > 0
+    assert (fair_results["temporary"]["rf"] - fair_results["permanent"]["rf"]).sum() > 0
 
 
 def test_get_equivalence_ratio() -> None:
@@ -105,7 +122,140 @@ def test_get_equivalence_ratio_values(time_horizon) -> None:
     )
     yr_idx = np.where(scenario.Emissions.year == year)[0][0]
     assert math.isclose(
-        sum(fair_results["default"]["rf"][yr_idx : yr_idx + time_horizon]),
-        sum(fair_results["offset"]["rf"][yr_idx : yr_idx + time_horizon]),
+        fair_results["default"]["rf"][yr_idx : yr_idx + time_horizon].sum(),
+        fair_results["offset"]["rf"][yr_idx : yr_idx + time_horizon].sum(),
         abs_tol=10**-12,
     )
+
+
+def test_get_equivalence_ratio_bracket_fallback(monkeypatch) -> None:
+    scenario = ssp245
+    year = 2022
+    length = 10
+    storage_magnitude = 0.1
+    time_horizon = 100
+    expected = get_equivalence_ratio(
+        scenario, year, length, storage_magnitude, time_horizon
+    )
+    # skipping the secant search and using a bracket that misses the root forces the
+    # full range search
+    monkeypatch.setattr(core, "_secant_root", lambda *args: None)
+    monkeypatch.setattr(core, "_bracket", lambda *args: (1, 2))
+    equivalence_ratio = get_equivalence_ratio(
+        scenario, year, length, storage_magnitude, time_horizon
+    )
+    assert isinstance(equivalence_ratio, float)
+    assert math.isclose(equivalence_ratio, expected, rel_tol=1e-4)
+
+
+def test_get_equivalence_ratio_lowest_crossing() -> None:
+    # a large early storage makes the objective cross zero more than once, and the search
+    # should settle on the lowest crossing, which a bisection over [1, 1000] finds here
+    args = (ssp245, 1800, 5, 500, 400)
+    expected = optimize.bisect(core.compare_rf, 1, 1000, args=args)
+    assert math.isclose(get_equivalence_ratio(*args), expected, rel_tol=1e-4)
+
+
+def test_get_equivalence_ratio_sees_scenario_changes() -> None:
+    scenario = copy.deepcopy(ssp245)
+    args = (2022, 10, 0.1, 100)
+    before = get_equivalence_ratio(scenario, *args)
+    scenario.Emissions.co2_fossil[200:] *= 2
+    assert not math.isclose(get_equivalence_ratio(scenario, *args), before)
+
+
+def test_run_fair_scenarios_subset() -> None:
+    scenario = ssp245
+    storage, reemission, justified = get_perturbations(scenario, 2022, 10, 0.1, 1)
+    experimental_scenarios, fair_results = run_fair(
+        scenario, storage, reemission, justified, scenarios=("default", "offset")
+    )
+    assert len(experimental_scenarios) == 5
+    assert set(fair_results) == {"default", "offset"}
+
+
+def test_get_equivalence_ratios_batch() -> None:
+    scenario = ssp245
+    lengths = np.array([1, 10])
+    magnitudes = np.array([[0.1], [1]])
+    time_horizon = 100
+    ratios = get_equivalence_ratios_batch(
+        scenario, 2022, lengths, magnitudes, time_horizon
+    )
+    assert ratios.shape == (2, 2)
+    assert math.isclose(
+        ratios[0, 1],
+        get_equivalence_ratio(scenario, 2022, 10, 0.1, time_horizon),
+    )
+
+
+def test_run_fair_n_years() -> None:
+    scenario = ssp245
+    n_years = 300
+    storage, reemission, justified = get_perturbations(scenario, 2022, 10, 0.1, 1)
+    _, fair_results = run_fair(scenario, storage, reemission, justified)
+    experimental_scenarios, truncated_results = run_fair(
+        scenario, storage, reemission, justified, n_years=n_years
+    )
+    assert len(experimental_scenarios["offset"]) == n_years
+    for name in fair_results:
+        np.testing.assert_array_equal(
+            truncated_results[name]["rf"], fair_results[name]["rf"][:n_years]
+        )
+
+
+def test_run_fair_batch() -> None:
+    ssps = [ssp119, ssp370]
+    perturbations = [get_perturbations(ssp, 2022, 10, 1, 2) for ssp in ssps]
+    results = run_fair_batch(ssps, *zip(*perturbations), max_workers=2)
+    assert len(results) == len(ssps)
+    for ssp, (storage, reemission, justified), (_, fair_results) in zip(
+        ssps, perturbations, results
+    ):
+        _, expected = run_fair(ssp, storage, reemission, justified)
+        np.testing.assert_array_equal(
+            fair_results["offset"]["rf"], expected["offset"]["rf"]
+        )
+
+
+def test_run_fair_batch_length_mismatch() -> None:
+    storage, reemission, justified = get_perturbations(ssp119, 2022, 10, 1, 2)
+    with pytest.raises(ValueError):
+        run_fair_batch(
+            [ssp119, ssp370], [storage], [reemission, reemission], [justified] * 2
+        )
+
+
+@pytest.mark.parametrize("scenario", [ssp119, ssp245, ssp370])
+def test_fast_fair_scm(scenario) -> None:
+    storage, reemission, justified = get_perturbations(scenario, 2022, 10, 10, 2)
+    emissions = scenario.Emissions.co2_land + scenario.Emissions.co2_fossil + justified
+    other_rf = np.zeros_like(emissions)
+    expected = fair.forward.fair_scm(
+        emissions=emissions,
+        other_rf=other_rf,
+        useMultigas=False,
+        gir_carbon_cycle=False,
+    )
+    for result, expected_result in zip(fast_fair_scm(emissions, other_rf), expected):
+        np.testing.assert_allclose(result, expected_result, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("temp_yr, temp_length", [(1950, 1), (1800, 5)])
+def test_fast_fair_scm_large_storage(temp_yr, temp_length) -> None:
+    # a large early storage pushes FaIR's carbon cycle to a near-zero decay time scaling
+    scenario = ssp245
+    perturbations = get_perturbations(scenario, temp_yr, temp_length, 500, 2)
+    experimental_scenarios, _ = run_fair(scenario, *perturbations)
+    for emissions in experimental_scenarios.values():
+        other_rf = np.zeros_like(emissions)
+        expected = fair.forward.fair_scm(
+            emissions=emissions,
+            other_rf=other_rf,
+            useMultigas=False,
+            gir_carbon_cycle=False,
+        )
+        for result, expected_result in zip(
+            fast_fair_scm(emissions, other_rf), expected
+        ):
+            np.testing.assert_allclose(result, expected_result, rtol=0, atol=1e-6)